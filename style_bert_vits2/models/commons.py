@@ -68,6 +68,23 @@ def intersperse(lst: list[Any], item: Any) -> list[Any]:
     return result
 
 
+def intersperse_tensor(lst: list[int], item: int) -> torch.LongTensor:
+    """
+    リストの要素の間に特定のアイテムを挿入した LongTensor を返す
+    intersperse() と異なり、中間の Python リストを作らずに直接テンソルを構築する
+
+    Args:
+        lst (list[int]): 元のリスト
+        item (int): 挿入するアイテム
+
+    Returns:
+        torch.LongTensor: 新しいテンソル
+    """
+    result = torch.full((len(lst) * 2 + 1,), item, dtype=torch.long)
+    result[1::2] = torch.as_tensor(lst, dtype=torch.long)
+    return result  # type: ignore
+
+
 def slice_segments(
     x: torch.Tensor, ids_str: torch.Tensor, segment_size: int = 4
 ) -> torch.Tensor:
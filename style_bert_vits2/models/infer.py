@@ -1,3 +1,6 @@
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Any, Optional, Union, cast
 
 import torch
@@ -12,13 +15,28 @@ from style_bert_vits2.models.models_jp_extra import (
     SynthesizerTrn as SynthesizerTrnJPExtra,
 )
 from style_bert_vits2.nlp import (
+    bert_models,
     clean_text,
     cleaned_text_to_sequence,
     extract_bert_feature,
 )
+from style_bert_vits2.nlp.japanese import pyopenjtalk_worker
 from style_bert_vits2.nlp.symbols import SYMBOLS
 
 
+# 使われない言語の BERT 特徴量として渡すゼロテンソルのキャッシュ
+# デバイス・dtype と、系列長を 2 の累乗に切り上げた長さをキーとし、毎回の推論でゼロテンソルを確保し直さずに済むようにする
+# 推論に利用するデバイス上に直接確保しておくことで、推論のたびにホストからデバイスへ転送する必要もなくなる
+__zero_bert_cache: dict[tuple[str, torch.dtype, int], torch.Tensor] = {}
+
+# 各言語の BERT 特徴量が、モデルへの入力 (bert, ja_bert, en_bert) のうちどの位置に入るか
+__BERT_SLOTS: dict[Languages, int] = {
+    Languages.ZH: 0,
+    Languages.JP: 1,
+    Languages.EN: 2,
+}
+
+
 def get_net_g(model_path: str, version: str, device: str, hps: HyperParameters):
     if version.endswith("JP-Extra"):
         logger.info("Using JP-Extra model")
@@ -95,6 +113,76 @@ def get_net_g(model_path: str, version: str, device: str, hps: HyperParameters):
     return net_g
 
 
+def warmup_net_g(
+    net_g: Union[SynthesizerTrn, SynthesizerTrnJPExtra],
+    hps: HyperParameters,
+    device: str,
+    seq_len: int = 10,
+) -> None:
+    """
+    ダミー入力で音声合成モデルの推論を 1 回だけ実行し、初回推論時のみにかかるコスト
+    (CUDA カーネルの初期化やメモリアロケータの確保など) をモデルのロード時に済ませておく。
+    BERT モデルや pyopenjtalk は使わないため、これらがロードされていなくても実行できる。
+
+    Args:
+        net_g (Union[SynthesizerTrn, SynthesizerTrnJPExtra]): 音声合成モデル
+        hps (HyperParameters): ハイパーパラメータ
+        device (str): 推論に利用するデバイス
+        seq_len (int, optional): ダミー入力の系列長. Defaults to 10.
+    """
+
+    with torch.no_grad():
+        x_tst = torch.zeros(1, seq_len, dtype=torch.long, device=device)
+        x_tst_lengths = torch.tensor([seq_len], dtype=torch.long, device=device)
+        sid_tensor = torch.zeros(1, dtype=torch.long, device=device)
+        bert = torch.zeros(1, 1024, seq_len, device=device)
+        style_vec_tensor = torch.zeros(1, 256, device=device)
+        if hps.version.endswith("JP-Extra"):
+            cast(SynthesizerTrnJPExtra, net_g).infer(
+                x_tst,
+                x_tst_lengths,
+                sid_tensor,
+                x_tst,
+                x_tst,
+                bert,
+                style_vec=style_vec_tensor,
+            )
+        else:
+            cast(SynthesizerTrn, net_g).infer(
+                x_tst,
+                x_tst_lengths,
+                sid_tensor,
+                x_tst,
+                x_tst,
+                bert,
+                bert,
+                bert,
+                style_vec=style_vec_tensor,
+            )
+
+
+def __get_zero_bert(seq_len: int, device: str, dtype: torch.dtype) -> torch.Tensor:
+    """
+    使われない言語の BERT 特徴量として渡す、形状が (1024, seq_len) のゼロテンソルを返す。
+    キャッシュ済みのテンソルのビューを返すため、返り値を in-place で書き換えてはならない。
+
+    Args:
+        seq_len (int): 系列長 (音素数)
+        device (str): ゼロテンソルを確保するデバイス
+        dtype (torch.dtype): ゼロテンソルの dtype (実際に使われる BERT 特徴量の dtype に合わせる)
+
+    Returns:
+        torch.Tensor: ゼロテンソル
+    """
+
+    capacity = 1 << max(seq_len - 1, 0).bit_length()
+    zero_bert = __zero_bert_cache.get((device, dtype, capacity))
+    if zero_bert is None:
+        zero_bert = torch.zeros(1024, capacity, device=device, dtype=dtype)
+        __zero_bert_cache[(device, dtype, capacity)] = zero_bert
+    return zero_bert[:, :seq_len]
+
+
 def get_text(
     text: str,
     language_str: Languages,
@@ -105,7 +193,64 @@ def get_text(
     given_phone: Optional[list[str]] = None,
     given_tone: Optional[list[int]] = None,
 ):
-    use_jp_extra = hps.version.endswith("JP-Extra")
+    """
+    テキストから音声合成モデルへの入力 (BERT 特徴量・音素・アクセント・言語 ID) を生成する。
+    同じテキストをスタイルや話者を変えて何度も音声合成する場合に備え、結果は引数ごとにキャッシュされる。
+    キャッシュされる BERT 特徴量は推論デバイス上ではなく CPU 上のテンソルで、推論時に推論デバイスへ転送される。
+    キャッシュ済みのテンソルがそのまま返されるため、返り値を in-place で書き換えてはならない。
+    """
+
+    bert_ori, phone, tone, language = __get_text_cached(
+        text,
+        language_str,
+        hps.version.endswith("JP-Extra"),
+        hps.data.add_blank,
+        device,
+        assist_text,
+        assist_text_weight,
+        tuple(given_phone) if given_phone is not None else None,
+        tuple(given_tone) if given_tone is not None else None,
+        pyopenjtalk_worker.USER_DICT_VERSION,
+        bert_models.UNLOAD_COUNT,
+    )
+
+    # テキストの言語に対応する位置にだけ BERT 特徴量を入れ、それ以外はゼロテンソルにする
+    ## ゼロテンソルは推論デバイス上にキャッシュされたものを使うため、get_text() のキャッシュには含めない
+    slot = __BERT_SLOTS.get(language_str)
+    if slot is None:
+        raise ValueError("language_str should be ZH, JP or EN")
+    zero_bert = __get_zero_bert(len(phone), device, bert_ori.dtype)
+    bert, ja_bert, en_bert = (
+        bert_ori if i == slot else zero_bert for i in range(len(__BERT_SLOTS))
+    )
+
+    assert bert.shape[-1] == len(
+        phone
+    ), f"Bert seq len {bert.shape[-1]} != {len(phone)}"
+
+    return bert, ja_bert, en_bert, phone, tone, language
+
+
+@lru_cache(maxsize=128)
+def __get_text_cached(
+    text: str,
+    language_str: Languages,
+    use_jp_extra: bool,
+    add_blank: bool,
+    device: str,
+    assist_text: Optional[str],
+    assist_text_weight: float,
+    given_phone: Optional[tuple[str, ...]],
+    given_tone: Optional[tuple[int, ...]],
+    user_dict_version: int,
+    bert_unload_count: int,
+):
+    """
+    get_text() のうち、G2P と BERT 特徴量の抽出を行う部分。lru_cache でキャッシュするため、引数は全てハッシュ可能な値で受け取る。
+    user_dict_version は、ユーザー辞書が更新された際に古い読みのキャッシュを使わないようにするためだけに渡される。
+    bert_unload_count は、BERT モデルが入れ替えられた際に古いモデルによる特徴量のキャッシュを使わないようにするためだけに渡される。
+    """
+
     # 推論時のみ呼び出されるので、raise_yomi_error は False に設定
     norm_text, phone, tone, word2ph = clean_text(
         text,
@@ -127,7 +272,7 @@ def get_text(
             if language_str == Languages.JP:
                 from style_bert_vits2.nlp.japanese.g2p import adjust_word2ph
 
-                word2ph = adjust_word2ph(word2ph, phone, given_phone)
+                word2ph = adjust_word2ph(word2ph, phone, list(given_phone))
                 # 上記処理により word2ph の合計が given_phone の長さと一致するはず
                 # それでも一致しない場合、大半は読み上げテキストと given_phone が著しく乖離していて調整し切れなかったことを意味する
                 if len(given_phone) != sum(word2ph):
@@ -138,13 +283,13 @@ def get_text(
                 raise InvalidPhoneError(
                     f"Length of given_phone ({len(given_phone)}) != sum of word2ph ({sum(word2ph)})"
                 )
-        phone = given_phone
+        phone = list(given_phone)
         # 生成あるいは指定された phone と指定された tone 両方の長さが一致していなければならない
         if len(phone) != len(given_tone):
             raise InvalidToneError(
                 f"Length of phone ({len(phone)}) != length of given_tone ({len(given_tone)})"
             )
-        tone = given_tone
+        tone = list(given_tone)
     # tone だけが与えられた場合は clean_text() で生成した phone と合わせて使う
     elif given_tone is not None:
         # 生成した phone と指定された tone 両方の長さが一致していなければならない
@@ -152,16 +297,20 @@ def get_text(
             raise InvalidToneError(
                 f"Length of phone ({len(phone)}) != length of given_tone ({len(given_tone)})"
             )
-        tone = given_tone
+        tone = list(given_tone)
     phone, tone, language = cleaned_text_to_sequence(phone, tone, language_str)
 
-    if hps.data.add_blank:
-        phone = commons.intersperse(phone, 0)
-        tone = commons.intersperse(tone, 0)
-        language = commons.intersperse(language, 0)
-        for i in range(len(word2ph)):
-            word2ph[i] = word2ph[i] * 2
+    # Python のリストを経由せず、直接 LongTensor を構築する
+    if add_blank:
+        phone = commons.intersperse_tensor(phone, 0)
+        tone = commons.intersperse_tensor(tone, 0)
+        language = commons.intersperse_tensor(language, 0)
+        word2ph = [i * 2 for i in word2ph]
         word2ph[0] += 1
+    else:
+        phone = torch.LongTensor(phone)
+        tone = torch.LongTensor(tone)
+        language = torch.LongTensor(language)
     bert_ori = extract_bert_feature(
         norm_text,
         word2ph,
@@ -170,32 +319,13 @@ def get_text(
         assist_text,
         assist_text_weight,
     )
-    del word2ph
     assert bert_ori.shape[-1] == len(phone), phone
 
-    if language_str == Languages.ZH:
-        bert = bert_ori
-        ja_bert = torch.zeros(1024, len(phone))
-        en_bert = torch.zeros(1024, len(phone))
-    elif language_str == Languages.JP:
-        bert = torch.zeros(1024, len(phone))
-        ja_bert = bert_ori
-        en_bert = torch.zeros(1024, len(phone))
-    elif language_str == Languages.EN:
-        bert = torch.zeros(1024, len(phone))
-        ja_bert = torch.zeros(1024, len(phone))
-        en_bert = bert_ori
-    else:
-        raise ValueError("language_str should be ZH, JP or EN")
+    return bert_ori, phone, tone, language
 
-    assert bert.shape[-1] == len(
-        phone
-    ), f"Bert seq len {bert.shape[-1]} != {len(phone)}"
 
-    phone = torch.LongTensor(phone)
-    tone = torch.LongTensor(tone)
-    language = torch.LongTensor(language)
-    return bert, ja_bert, en_bert, phone, tone, language
+# BERT モデル/トークナイザーがアンロードされたら、そのモデルで抽出した特徴量のキャッシュも解放する
+bert_models.register_unload_callback(__get_text_cached.cache_clear)
 
 
 def infer(
@@ -228,31 +358,24 @@ def infer(
         given_phone=given_phone,
         given_tone=given_tone,
     )
-    if skip_start:
-        phones = phones[3:]
-        tones = tones[3:]
-        lang_ids = lang_ids[3:]
-        bert = bert[:, 3:]
-        ja_bert = ja_bert[:, 3:]
-        en_bert = en_bert[:, 3:]
-    if skip_end:
-        phones = phones[:-2]
-        tones = tones[:-2]
-        lang_ids = lang_ids[:-2]
-        bert = bert[:, :-2]
-        ja_bert = ja_bert[:, :-2]
-        en_bert = en_bert[:, :-2]
+    # skip_start なら先頭の 3 要素、skip_end なら末尾の 2 要素を、それぞれ 1 回のスライスでまとめて取り除く
+    if skip_start or skip_end:
+        start = 3 if skip_start else 0
+        end = -2 if skip_end else None
+        phones = phones[start:end]
+        tones = tones[start:end]
+        lang_ids = lang_ids[start:end]
+        bert = bert[:, start:end]
+        ja_bert = ja_bert[:, start:end]
+        en_bert = en_bert[:, start:end]
     with torch.no_grad():
         x_tst = phones.to(device).unsqueeze(0)
         tones = tones.to(device).unsqueeze(0)
         lang_ids = lang_ids.to(device).unsqueeze(0)
-        bert = bert.to(device).unsqueeze(0)
         ja_bert = ja_bert.to(device).unsqueeze(0)
-        en_bert = en_bert.to(device).unsqueeze(0)
-        x_tst_lengths = torch.LongTensor([phones.size(0)]).to(device)
+        x_tst_lengths = torch.tensor([phones.size(0)], dtype=torch.long, device=device)
         style_vec_tensor = torch.from_numpy(style_vec).to(device).unsqueeze(0)
-        del phones
-        sid_tensor = torch.LongTensor([sid]).to(device)
+        sid_tensor = torch.tensor([sid], dtype=torch.long, device=device)
         if is_jp_extra:
             output = cast(SynthesizerTrnJPExtra, net_g).infer(
                 x_tst,
@@ -268,6 +391,9 @@ def infer(
                 length_scale=length_scale,
             )
         else:
+            # JP-Extra モデルでは ja_bert しか使われないので、それ以外はこちらでのみデバイスに転送する
+            bert = bert.to(device).unsqueeze(0)
+            en_bert = en_bert.to(device).unsqueeze(0)
             output = cast(SynthesizerTrn, net_g).infer(
                 x_tst,
                 x_tst_lengths,
@@ -284,22 +410,217 @@ def infer(
                 length_scale=length_scale,
             )
         audio = output[0][0, 0].data.cpu().float().numpy()
-        del (
-            x_tst,
-            tones,
-            lang_ids,
-            bert,
-            x_tst_lengths,
-            sid_tensor,
-            ja_bert,
-            en_bert,
-            style_vec,
-        )  # , emo
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
         return audio
 
 
+def infer_batch(
+    texts: list[str],
+    style_vec: NDArray[Any],
+    sdp_ratio: float,
+    noise_scale: float,
+    noise_scale_w: float,
+    length_scale: float,
+    sid: int,
+    language: Languages,
+    hps: HyperParameters,
+    net_g: Union[SynthesizerTrn, SynthesizerTrnJPExtra],
+    device: str,
+    assist_text: Optional[str] = None,
+    assist_text_weight: float = 0.7,
+) -> list[NDArray[Any]]:
+    """
+    複数のテキストを系列長が最大のものに合わせてパディングし、1 回の推論でまとめて音声合成する。
+    短いテキストを大量に音声合成する場合に、テキストごとに infer() を呼ぶよりも推論のオーバーヘッドを削減できる。
+    パディング部分はモデル内部でマスクされ、生成された音声はテキストごとの長さに切り詰めて返される。
+
+    Args:
+        texts (list[str]): 読み上げるテキストのリスト
+        style_vec (NDArray[Any]): スタイルベクトル (全てのテキストで共通)
+        sdp_ratio (float): DP と SDP の混合比
+        noise_scale (float): DP に与えられるノイズ
+        noise_scale_w (float): SDP に与えられるノイズ
+        length_scale (float): 生成音声の長さ（話速）のパラメータ
+        sid (int): 話者 ID (全てのテキストで共通)
+        language (Languages): テキストの言語
+        hps (HyperParameters): ハイパーパラメータ
+        net_g (Union[SynthesizerTrn, SynthesizerTrnJPExtra]): 音声合成モデル
+        device (str): 推論に利用するデバイス
+        assist_text (Optional[str], optional): 感情表現の参照元の補助テキスト. Defaults to None.
+        assist_text_weight (float, optional): 感情表現の補助テキストを適用する強さ. Defaults to 0.7.
+
+    Returns:
+        list[NDArray[Any]]: テキストごとの音声データのリスト
+    """
+
+    if len(texts) == 0:
+        return []
+
+    is_jp_extra = hps.version.endswith("JP-Extra")
+    features = [
+        get_text(
+            text,
+            language,
+            hps,
+            device,
+            assist_text=assist_text,
+            assist_text_weight=assist_text_weight,
+        )
+        for text in texts
+    ]
+    lengths = [phones.size(0) for _, _, _, phones, _, _ in features]
+    batch_size, max_len = len(features), max(lengths)
+    bert_dtype = features[0][1].dtype
+
+    with torch.no_grad():
+        # 各テキストの入力を、最大の系列長に合わせてゼロパディングしたテンソルに詰める
+        x_tst = torch.zeros(batch_size, max_len, dtype=torch.long, device=device)
+        tones = torch.zeros(batch_size, max_len, dtype=torch.long, device=device)
+        lang_ids = torch.zeros(batch_size, max_len, dtype=torch.long, device=device)
+        ja_bert = torch.zeros(
+            batch_size, 1024, max_len, device=device, dtype=bert_dtype
+        )
+        # JP-Extra モデルでは ja_bert しか使われないので、それ以外は確保しない
+        if not is_jp_extra:
+            bert = torch.zeros(
+                batch_size, 1024, max_len, device=device, dtype=bert_dtype
+            )
+            en_bert = torch.zeros(
+                batch_size, 1024, max_len, device=device, dtype=bert_dtype
+            )
+        for i, (b, jb, eb, p, t, l) in enumerate(features):
+            x_tst[i, : lengths[i]] = p
+            tones[i, : lengths[i]] = t
+            lang_ids[i, : lengths[i]] = l
+            ja_bert[i, :, : lengths[i]] = jb
+            if not is_jp_extra:
+                bert[i, :, : lengths[i]] = b
+                en_bert[i, :, : lengths[i]] = eb
+        x_tst_lengths = torch.tensor(lengths, dtype=torch.long, device=device)
+        sid_tensor = torch.full((batch_size,), sid, dtype=torch.long, device=device)
+        style_vec_tensor = (
+            torch.from_numpy(style_vec).to(device).unsqueeze(0).expand(batch_size, -1)
+        )
+        if is_jp_extra:
+            output = cast(SynthesizerTrnJPExtra, net_g).infer(
+                x_tst,
+                x_tst_lengths,
+                sid_tensor,
+                tones,
+                lang_ids,
+                ja_bert,
+                style_vec=style_vec_tensor,
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                length_scale=length_scale,
+            )
+        else:
+            output = cast(SynthesizerTrn, net_g).infer(
+                x_tst,
+                x_tst_lengths,
+                sid_tensor,
+                tones,
+                lang_ids,
+                bert,
+                ja_bert,
+                en_bert,
+                style_vec=style_vec_tensor,
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                length_scale=length_scale,
+            )
+        o, _, y_mask, _ = output
+        # y_mask からテキストごとのフレーム数を求め、パディング部分を除いた音声を切り出す
+        hop_length = o.size(-1) // y_mask.size(-1)
+        y_lengths = y_mask.sum(dim=(1, 2)).long().tolist()
+        audios = [
+            o[i, 0, : y_lengths[i] * hop_length].data.cpu().float().numpy()
+            for i in range(batch_size)
+        ]
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return audios
+
+
+def infer_stream(
+    texts: list[str],
+    style_vec: NDArray[Any],
+    sdp_ratio: float,
+    noise_scale: float,
+    noise_scale_w: float,
+    length_scale: float,
+    sid: int,
+    language: Languages,
+    hps: HyperParameters,
+    net_g: Union[SynthesizerTrn, SynthesizerTrnJPExtra],
+    device: str,
+    assist_text: Optional[str] = None,
+    assist_text_weight: float = 0.7,
+) -> Iterator[NDArray[Any]]:
+    """
+    文単位などに分割された複数のテキストを順に音声合成し、1 つ生成するごとにその音声データを yield する。
+    テキストを音声合成している間に、次のテキストの get_text() (G2P と BERT 特徴量の抽出) をバックグラウンドのスレッドで先行して実行する。
+    全体の生成完了を待たずに最初の音声を返せるほか、テキスト処理と音声合成が重なる分だけ全体の生成時間も短くなる。
+
+    Args:
+        texts (list[str]): 読み上げるテキストのリスト
+        style_vec (NDArray[Any]): スタイルベクトル (全てのテキストで共通)
+        sdp_ratio (float): DP と SDP の混合比
+        noise_scale (float): DP に与えられるノイズ
+        noise_scale_w (float): SDP に与えられるノイズ
+        length_scale (float): 生成音声の長さ（話速）のパラメータ
+        sid (int): 話者 ID (全てのテキストで共通)
+        language (Languages): テキストの言語
+        hps (HyperParameters): ハイパーパラメータ
+        net_g (Union[SynthesizerTrn, SynthesizerTrnJPExtra]): 音声合成モデル
+        device (str): 推論に利用するデバイス
+        assist_text (Optional[str], optional): 感情表現の参照元の補助テキスト. Defaults to None.
+        assist_text_weight (float, optional): 感情表現の補助テキストを適用する強さ. Defaults to 0.7.
+
+    Yields:
+        NDArray[Any]: テキストごとの音声データ
+    """
+
+    if len(texts) == 0:
+        return
+
+    def prefetch(text: str) -> None:
+        # get_text() の結果はキャッシュされるため、ここで先に呼んでおけば infer() 内での呼び出しはキャッシュから返る
+        get_text(
+            text,
+            language,
+            hps,
+            device,
+            assist_text=assist_text,
+            assist_text_weight=assist_text_weight,
+        )
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(prefetch, texts[0])
+        for i, text in enumerate(texts):
+            future.result()
+            if i + 1 < len(texts):
+                future = executor.submit(prefetch, texts[i + 1])
+            yield infer(
+                text=text,
+                style_vec=style_vec,
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                length_scale=length_scale,
+                sid=sid,
+                language=language,
+                hps=hps,
+                net_g=net_g,
+                device=device,
+                assist_text=assist_text,
+                assist_text_weight=assist_text_weight,
+            )
+
+
 class InvalidPhoneError(ValueError):
     pass
 
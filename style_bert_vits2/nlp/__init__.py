@@ -115,6 +115,6 @@ def cleaned_text_to_sequence(
     tone_start = LANGUAGE_TONE_START_MAP[language]
     tones = [i + tone_start for i in tones]
     lang_id = LANGUAGE_ID_MAP[language]
-    lang_ids = [lang_id for i in phones]
+    lang_ids = [lang_id] * len(phones)
 
     return phones, tones, lang_ids
@@ -9,7 +9,8 @@ Style-Bert-VITS2 の学習・推論に必要な各言語ごとの BERT モデル
 """
 
 import gc
-from typing import Optional, Union, cast
+import threading
+from typing import Callable, Optional, Union, cast
 
 import torch
 from transformers import (
@@ -34,6 +35,18 @@ __loaded_tokenizers: dict[
     Languages, Union[PreTrainedTokenizer, PreTrainedTokenizerFast, DebertaV2Tokenizer]
 ] = {}
 
+# BERT モデル/トークナイザーのロード処理を排他するためのロック
+## 推論時の先読みなど複数スレッドから同時に初回ロードが行われた場合に、同じモデルが多重にロードされるのを防ぐ
+__load_lock = threading.Lock()
+
+# BERT モデル/トークナイザーがアンロードされるたびにインクリメントされるカウンター
+# BERT 特徴量をキャッシュする側は、この値をキャッシュのキーに含めることで、アンロード後に別のモデルがロードされたことを検知できる
+UNLOAD_COUNT: int = 0
+
+# BERT モデル/トークナイザーのアンロード時に呼び出されるコールバックのリスト
+## BERT 特徴量をキャッシュする側が、アンロードされたモデルによる特徴量のキャッシュを解放するために登録する
+__unload_callbacks: list[Callable[[], None]] = []
+
 
 def load_model(
     language: Languages,
@@ -68,32 +81,39 @@ def load_model(
     if language in __loaded_models:
         return __loaded_models[language]
 
-    # pretrained_model_name_or_path が指定されていない場合はデフォルトのパスを利用
-    if pretrained_model_name_or_path is None:
-        assert DEFAULT_BERT_TOKENIZER_PATHS[
-            language
-        ].exists(), f"The default {language} BERT model does not exist on the file system. Please specify the path to the pre-trained model."
-        pretrained_model_name_or_path = str(DEFAULT_BERT_TOKENIZER_PATHS[language])
-
-    # BERT モデルをロードし、辞書に格納して返す
-    ## 英語のみ DebertaV2Model でロードする必要がある
-    if language == Languages.EN:
-        model = cast(
-            DebertaV2Model,
-            DebertaV2Model.from_pretrained(
+    with __load_lock:
+        # ロックの取得を待っている間に他のスレッドがロードを終えていれば、それを返す
+        if language in __loaded_models:
+            return __loaded_models[language]
+
+        # pretrained_model_name_or_path が指定されていない場合はデフォルトのパスを利用
+        if pretrained_model_name_or_path is None:
+            assert DEFAULT_BERT_TOKENIZER_PATHS[
+                language
+            ].exists(), f"The default {language} BERT model does not exist on the file system. Please specify the path to the pre-trained model."
+            pretrained_model_name_or_path = str(DEFAULT_BERT_TOKENIZER_PATHS[language])
+
+        # BERT モデルをロードし、辞書に格納して返す
+        ## 英語のみ DebertaV2Model でロードする必要がある
+        if language == Languages.EN:
+            model = cast(
+                DebertaV2Model,
+                DebertaV2Model.from_pretrained(
+                    pretrained_model_name_or_path,
+                    cache_dir=cache_dir,
+                    revision=revision,
+                ),
+            )
+        else:
+            model = AutoModelForMaskedLM.from_pretrained(
                 pretrained_model_name_or_path, cache_dir=cache_dir, revision=revision
-            ),
+            )
+        __loaded_models[language] = model
+        logger.info(
+            f"Loaded the {language} BERT model from {pretrained_model_name_or_path}"
         )
-    else:
-        model = AutoModelForMaskedLM.from_pretrained(
-            pretrained_model_name_or_path, cache_dir=cache_dir, revision=revision
-        )
-    __loaded_models[language] = model
-    logger.info(
-        f"Loaded the {language} BERT model from {pretrained_model_name_or_path}"
-    )
 
-    return model
+        return model
 
 
 def load_tokenizer(
@@ -129,33 +149,50 @@ def load_tokenizer(
     if language in __loaded_tokenizers:
         return __loaded_tokenizers[language]
 
-    # pretrained_model_name_or_path が指定されていない場合はデフォルトのパスを利用
-    if pretrained_model_name_or_path is None:
-        assert DEFAULT_BERT_TOKENIZER_PATHS[
-            language
-        ].exists(), f"The default {language} BERT tokenizer does not exist on the file system. Please specify the path to the pre-trained model."
-        pretrained_model_name_or_path = str(DEFAULT_BERT_TOKENIZER_PATHS[language])
-
-    # BERT トークナイザーをロードし、辞書に格納して返す
-    ## 英語のみ DebertaV2Tokenizer でロードする必要がある
-    if language == Languages.EN:
-        tokenizer = DebertaV2Tokenizer.from_pretrained(
-            pretrained_model_name_or_path,
-            cache_dir=cache_dir,
-            revision=revision,
-        )
-    else:
-        tokenizer = AutoTokenizer.from_pretrained(
-            pretrained_model_name_or_path,
-            cache_dir=cache_dir,
-            revision=revision,
+    with __load_lock:
+        # ロックの取得を待っている間に他のスレッドがロードを終えていれば、それを返す
+        if language in __loaded_tokenizers:
+            return __loaded_tokenizers[language]
+
+        # pretrained_model_name_or_path が指定されていない場合はデフォルトのパスを利用
+        if pretrained_model_name_or_path is None:
+            assert DEFAULT_BERT_TOKENIZER_PATHS[
+                language
+            ].exists(), f"The default {language} BERT tokenizer does not exist on the file system. Please specify the path to the pre-trained model."
+            pretrained_model_name_or_path = str(DEFAULT_BERT_TOKENIZER_PATHS[language])
+
+        # BERT トークナイザーをロードし、辞書に格納して返す
+        ## 英語のみ DebertaV2Tokenizer でロードする必要がある
+        if language == Languages.EN:
+            tokenizer = DebertaV2Tokenizer.from_pretrained(
+                pretrained_model_name_or_path,
+                cache_dir=cache_dir,
+                revision=revision,
+            )
+        else:
+            tokenizer = AutoTokenizer.from_pretrained(
+                pretrained_model_name_or_path,
+                cache_dir=cache_dir,
+                revision=revision,
+            )
+        __loaded_tokenizers[language] = tokenizer
+        logger.info(
+            f"Loaded the {language} BERT tokenizer from {pretrained_model_name_or_path}"
         )
-    __loaded_tokenizers[language] = tokenizer
-    logger.info(
-        f"Loaded the {language} BERT tokenizer from {pretrained_model_name_or_path}"
-    )
 
-    return tokenizer
+        return tokenizer
+
+
+def register_unload_callback(callback: Callable[[], None]) -> None:
+    """
+    BERT モデル/トークナイザーのアンロード時に呼び出されるコールバックを登録する。
+    アンロードされたモデルで抽出した BERT 特徴量をキャッシュしている場合に、そのキャッシュを解放するために使う。
+
+    Args:
+        callback (Callable[[], None]): アンロード時に引数なしで呼び出される関数
+    """
+
+    __unload_callbacks.append(callback)
 
 
 def unload_model(language: Languages) -> None:
@@ -166,8 +203,12 @@ def unload_model(language: Languages) -> None:
         language (Languages): アンロードする BERT モデルの言語
     """
 
+    global UNLOAD_COUNT
     if language in __loaded_models:
         del __loaded_models[language]
+        UNLOAD_COUNT += 1
+        for callback in __unload_callbacks:
+            callback()
         gc.collect()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
@@ -182,8 +223,12 @@ def unload_tokenizer(language: Languages) -> None:
         language (Languages): アンロードする BERT トークナイザーの言語
     """
 
+    global UNLOAD_COUNT
     if language in __loaded_tokenizers:
         del __loaded_tokenizers[language]
+        UNLOAD_COUNT += 1
+        for callback in __unload_callbacks:
+            callback()
         gc.collect()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
@@ -84,6 +84,9 @@ ARPA = {
 }
 _g2p = G2p()
 eng_dict = get_dict()
+# Membership in these is checked for every token / phone, so use sets instead of lists
+__PUNCTUATIONS_SET = frozenset(PUNCTUATIONS)
+__SYMBOLS_SET = frozenset(SYMBOLS)
 
 
 def g2p(text: str) -> tuple[list[str], list[int], list[int]]:
@@ -98,7 +101,7 @@ def g2p(text: str) -> tuple[list[str], list[int], list[int]]:
             word = ["".join(word)]
 
         for w in word:
-            if w in PUNCTUATIONS:
+            if w in __PUNCTUATIONS_SET:
                 temp_phones.append(w)
                 temp_tones.append(0)
                 continue
@@ -124,10 +127,11 @@ def g2p(text: str) -> tuple[list[str], list[int], list[int]]:
         tones += temp_tones
         phone_len.append(len(temp_phones))
 
-    word2ph = []
-    for token, pl in zip(words, phone_len):
-        word_len = len(token)
-        word2ph += __distribute_phone(pl, word_len)
+    word2ph = [
+        n_phone
+        for token, pl in zip(words, phone_len)
+        for n_phone in __distribute_phone(pl, len(token))
+    ]
 
     phones = ["_"] + phones + ["_"]
     tones = [0] + tones + [0]
@@ -138,25 +142,27 @@ def g2p(text: str) -> tuple[list[str], list[int], list[int]]:
     return phones, tones, word2ph
 
 
+# Built once at import time instead of on every call, since this runs for every phone
+__POST_REPLACE_MAP = {
+    "：": ",",
+    "；": ",",
+    "，": ",",
+    "。": ".",
+    "！": "!",
+    "？": "?",
+    "\n": ".",
+    "·": ",",
+    "、": ",",
+    "…": "...",
+    "···": "...",
+    "・・・": "...",
+    "v": "V",
+}
+
+
 def __post_replace_ph(ph: str) -> str:
-    REPLACE_MAP = {
-        "：": ",",
-        "；": ",",
-        "，": ",",
-        "。": ".",
-        "！": "!",
-        "？": "?",
-        "\n": ".",
-        "·": ",",
-        "、": ",",
-        "…": "...",
-        "···": "...",
-        "・・・": "...",
-        "v": "V",
-    }
-    if ph in REPLACE_MAP:
-        ph = REPLACE_MAP[ph]
-    if ph in SYMBOLS:
+    ph = __POST_REPLACE_MAP.get(ph, ph)
+    if ph in __SYMBOLS_SET:
         return ph
     return "UNK"
 
@@ -183,12 +189,13 @@ def __refine_syllables(syllables: list[list[str]]) -> tuple[list[str], list[int]
 
 
 def __distribute_phone(n_phone: int, n_word: int) -> list[int]:
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
+    # Same result as handing out phones one by one from left to right
+    if n_word == 0:
+        if n_phone != 0:
+            raise ValueError(f"Cannot distribute {n_phone} phones to 0 words")
+        return []
+    base, remainder = divmod(n_phone, n_word)
+    return [base + 1] * remainder + [base] * (n_word - remainder)
 
 
 def __text_to_words(text: str) -> list[list[str]]:
@@ -198,12 +205,12 @@ def __text_to_words(text: str) -> list[list[str]]:
     for idx, t in enumerate(tokens):
         if t.startswith("▁"):
             words.append([t[1:]])
-        elif t in PUNCTUATIONS:
+        elif t in __PUNCTUATIONS_SET:
             if idx == len(tokens) - 1:
                 words.append([f"{t}"])
             elif (
                 not tokens[idx + 1].startswith("▁")
-                and tokens[idx + 1] not in PUNCTUATIONS
+                and tokens[idx + 1] not in __PUNCTUATIONS_SET
             ):
                 if idx == 0:
                     words.append([])
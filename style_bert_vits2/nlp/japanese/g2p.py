@@ -1,5 +1,10 @@
 import re
-from typing import TypedDict
+from functools import lru_cache
+from itertools import chain
+from typing import Any, TypedDict
+
+import numba
+import numpy as np
 
 from style_bert_vits2.constants import Languages
 from style_bert_vits2.logging import logger
@@ -10,6 +15,10 @@ from style_bert_vits2.nlp.japanese.normalizer import replace_punctuation
 from style_bert_vits2.nlp.symbols import PUNCTUATIONS
 
 
+# punctuation の判定はホットループ内で頻繁に行われるので、毎回 set を作らずに済むよう事前に作っておく
+__PUNCTUATIONS_SET = frozenset(PUNCTUATIONS)
+
+
 def g2p(
     norm_text: str, use_jp_extra: bool = True, raise_yomi_error: bool = False
 ) -> tuple[list[str], list[int], list[int]]:
@@ -47,9 +56,7 @@ def g2p(
     sep_phonemes = __handle_long([__kata_to_phoneme_list(i) for i in sep_kata])
 
     # phone_w_punct: sep_phonemes を結合した、punctuation を元のまま保持した音素列
-    phone_w_punct: list[str] = []
-    for i in sep_phonemes:
-        phone_w_punct += i
+    phone_w_punct = list(chain.from_iterable(sep_phonemes))
 
     # punctuation 無しのアクセント情報を使って、punctuation を含めたアクセント情報を作る
     phone_tone_list = __align_tones(phone_w_punct, phone_tone_list_wo_punct)
@@ -58,22 +65,21 @@ def g2p(
     # word2ph は厳密な解答は不可能なので（「今日」「眼鏡」等の熟字訓が存在）、
     # Bert-VITS2 では、単語単位の分割を使って、単語の文字ごとにだいたい均等に音素を分配する
 
-    # sep_text から、各単語を1文字1文字分割して、文字のリスト（のリスト）を作る
-    sep_tokenized: list[list[str]] = []
-    for i in sep_text:
-        if i not in PUNCTUATIONS:
-            sep_tokenized.append(
-                bert_models.load_tokenizer(Languages.JP).tokenize(i)
-            )  # ここでおそらく`i`が文字単位に分割される
-        else:
-            sep_tokenized.append([i])
+    # sep_text から、各単語を1文字1文字分割したときの文字数のリストを作る
+    # トークナイザは単語ごとに取得せず、ループの前に1回だけ取得しておく
+    tokenizer = bert_models.load_tokenizer(Languages.JP)
+    sep_word_lens = [
+        # ここでおそらく`i`が文字単位に分割される
+        len(tokenizer.tokenize(i)) if i not in __PUNCTUATIONS_SET else 1
+        for i in sep_text
+    ]
 
     # 各単語について、音素の数と文字の数を比較して、均等っぽく分配する
-    word2ph = []
-    for token, phoneme in zip(sep_tokenized, sep_phonemes):
-        phone_len = len(phoneme)
-        word_len = len(token)
-        word2ph += __distribute_phone(phone_len, word_len)
+    word2ph = [
+        n_phone
+        for word_len, phoneme in zip(sep_word_lens, sep_phonemes)
+        for n_phone in __distribute_phone(len(phoneme), word_len)
+    ]
 
     # 最初と最後に `_` 記号を追加、アクセントは 0（低）、word2ph もそれに合わせて追加
     phone_tone_list = [("_", 0)] + phone_tone_list + [("_", 0)]
@@ -85,7 +91,8 @@ def g2p(
     assert len(phones) == sum(word2ph), f"{len(phones)} != {sum(word2ph)}"
 
     # use_jp_extra でない場合は「N」を「n」に変換
-    if not use_jp_extra:
+    ## 「N」が含まれない場合はリストを作り直さずにそのまま返す
+    if not use_jp_extra and "N" in phones:
         phones = [phone if phone != "N" else "n" for phone in phones]
 
     return phones, tones, word2ph
@@ -111,7 +118,7 @@ def text_to_sep_kata(
     """
 
     # parsed: OpenJTalkの解析結果
-    parsed = pyopenjtalk.run_frontend(norm_text)
+    parsed = __run_frontend(norm_text)
     sep_text: list[str] = []
     sep_kata: list[str] = []
 
@@ -136,7 +143,7 @@ def text_to_sep_kata(
         assert yomi != "", f"Empty yomi: {word}"
         if yomi == "、":
             # word は正規化されているので、`.`, `,`, `!`, `'`, `-`, `--` のいずれか
-            if not set(word).issubset(set(PUNCTUATIONS)):  # 記号繰り返しか判定
+            if not __PUNCTUATIONS_SET.issuperset(word):  # 記号繰り返しか判定
                 # ここは pyopenjtalk が読めない文字等のときに起こる
                 ## 例外を送出する場合
                 if raise_yomi_error:
@@ -160,6 +167,30 @@ def text_to_sep_kata(
     return sep_text, sep_kata
 
 
+def __run_frontend(text: str) -> list[dict[str, Any]]:
+    """
+    `pyopenjtalk.run_frontend()` の結果をキャッシュしつつ返す。
+    1つのテキストに対して `g2p()` 内の `text_to_sep_kata()` と `__pyopenjtalk_g2p_prosody()`、
+    さらに BERT 特徴量抽出時の `text_to_sep_kata()` と計3回同じ解析が走るため、その結果を使い回す。
+    ユーザー辞書の更新後に古い解析結果を返さないよう、辞書のバージョンをキャッシュのキーに含めている。
+    返り値はキャッシュと共有されているため、呼び出し側で変更してはならない。
+
+    Args:
+        text (str): 解析するテキスト
+
+    Returns:
+        list[dict[str, Any]]: OpenJTalk の解析結果
+    """
+
+    return __run_frontend_cached(text, pyopenjtalk.USER_DICT_VERSION)
+
+
+# 学習データの前処理では「はい」「うん」等の短いフレーズが何度も現れるので、テキストをまたいだヒットも見込めるよう大きめにとる
+@lru_cache(maxsize=1024)
+def __run_frontend_cached(text: str, user_dict_version: int) -> list[dict[str, Any]]:
+    return pyopenjtalk.run_frontend(text)
+
+
 def adjust_word2ph(
     word2ph: list[int],
     generated_phone: list[str],
@@ -188,6 +219,15 @@ def adjust_word2ph(
     generated_phone = generated_phone[1:-1]
     given_phone = given_phone[1:-1]
 
+    # 音素列が同一で、word2ph の合計が音素数と一致し、各要素が後段の調整範囲 (1 以上 6 以下) に
+    # 収まっている場合は差分も調整も発生しないので、LCS の計算等を行わずにそのまま返す
+    if (
+        generated_phone == given_phone
+        and sum(word2ph) == len(given_phone)
+        and all(1 <= i <= 6 for i in word2ph)
+    ):
+        return [1] + word2ph + [1]
+
     class DiffDetail(TypedDict):
         begin_index: int
         end_index: int
@@ -204,83 +244,53 @@ def adjust_word2ph(
         最長共通部分列を基にして、二つのリストの異なる部分を抽出する。
         """
 
-        def longest_common_subsequence(
-            X: list[str], Y: list[str]
-        ) -> list[tuple[int, int]]:
-            """
-            二つのリストの最長共通部分列のインデックスのペアを返す。
-            """
-            m, n = len(X), len(Y)
-            L = [[0] * (n + 1) for _ in range(m + 1)]
-            # LCSの長さを構築
-            for i in range(1, m + 1):
-                for j in range(1, n + 1):
-                    if X[i - 1] == Y[j - 1]:
-                        L[i][j] = L[i - 1][j - 1] + 1
-                    else:
-                        L[i][j] = max(L[i - 1][j], L[i][j - 1])
-            # LCSを逆方向にトレースしてインデックスのペアを取得
-            index_pairs = []
-            i, j = m, n
-            while i > 0 and j > 0:
-                if X[i - 1] == Y[j - 1]:
-                    index_pairs.append((i - 1, j - 1))
-                    i -= 1
-                    j -= 1
-                elif L[i - 1][j] >= L[i][j - 1]:
-                    i -= 1
-                else:
-                    j -= 1
-            index_pairs.reverse()
-            return index_pairs
-
-        differences = []
-        common_indices = longest_common_subsequence(generated_phone, given_phone)
+        differences: list[Diff] = []
+        common_indices = __longest_common_subsequence(
+            tuple(generated_phone), tuple(given_phone)
+        )
         prev_x, prev_y = -1, -1
 
+        def append_difference(
+            generated_begin: int, generated_end: int, given_begin: int, given_end: int
+        ) -> None:
+            generated_value = generated_phone[generated_begin:generated_end]
+            given_value = given_phone[given_begin:given_end]
+            # generated.value と given.value の両方が空の場合は差分ではないので追加しない
+            if len(generated_value) > 0 or len(given_value) > 0:
+                differences.append(
+                    {
+                        "generated": {
+                            "begin_index": generated_begin,
+                            "end_index": generated_end,
+                            "value": generated_value,
+                        },
+                        "given": {
+                            "begin_index": given_begin,
+                            "end_index": given_end,
+                            "value": given_value,
+                        },
+                    }
+                )
+
         # 共通部分のインデックスを基にして差分を抽出
         for x, y in common_indices:
-            diff_X = {
-                "begin_index": prev_x + 1,
-                "end_index": x,
-                "value": generated_phone[prev_x + 1 : x],
-            }
-            diff_Y = {
-                "begin_index": prev_y + 1,
-                "end_index": y,
-                "value": given_phone[prev_y + 1 : y],
-            }
-            if diff_X or diff_Y:
-                differences.append({"generated": diff_X, "given": diff_Y})
+            append_difference(prev_x + 1, x, prev_y + 1, y)
             prev_x, prev_y = x, y
         # 最後の非共通部分を追加
         if prev_x < len(generated_phone) - 1 or prev_y < len(given_phone) - 1:
-            differences.append(
-                {
-                    "generated": {
-                        "begin_index": prev_x + 1,
-                        "end_index": len(generated_phone) - 1,
-                        "value": generated_phone[prev_x + 1 : len(generated_phone) - 1],
-                    },
-                    "given": {
-                        "begin_index": prev_y + 1,
-                        "end_index": len(given_phone) - 1,
-                        "value": given_phone[prev_y + 1 : len(given_phone) - 1],
-                    },
-                }
+            append_difference(
+                prev_x + 1, len(generated_phone) - 1, prev_y + 1, len(given_phone) - 1
             )
-        # generated.value と given.value の両方が空の要素を diffrences から削除
-        for diff in differences[:]:
-            if (
-                len(diff["generated"]["value"]) == 0
-                and len(diff["given"]["value"]) == 0
-            ):
-                differences.remove(diff)
 
         return differences
 
     # 二つのリストの差分を抽出
     differences = extract_differences(generated_phone, given_phone)
+    # 音素ごとに差分を線形探索しなくて済むよう、generated 側の開始インデックスから差分を引けるようにしておく
+    ## 同じ開始インデックスの差分が複数ある場合は、先に見つかったものを使う
+    differences_by_begin_index: dict[int, Diff] = {}
+    for diff in differences:
+        differences_by_begin_index.setdefault(diff["generated"]["begin_index"], diff)
 
     # word2ph をもとにして新しく作る word2ph のリスト
     ## 長さは word2ph と同じだが、中身は 0 で初期化されている
@@ -297,11 +307,7 @@ def adjust_word2ph(
         # 音素の数だけループを回す
         for _ in range(word2ph_element):
             # difference の中に 処理中の generated_phone から始まる差分があるかどうかを確認
-            current_diff: Diff | None = None
-            for diff in differences:
-                if diff["generated"]["begin_index"] == current_generated_index:
-                    current_diff = diff
-                    break
+            current_diff = differences_by_begin_index.get(current_generated_index)
             # current_diff が None でない場合、generated_phone から始まる差分がある
             if current_diff is not None:
                 # generated から given で変わった音素数の差分を取得 (2増えた場合は +2 だし、2減った場合は -2)
@@ -371,6 +377,97 @@ def adjust_word2ph(
     return [1] + adjusted_word2ph + [1]
 
 
+@lru_cache(maxsize=4096)
+def __longest_common_subsequence(
+    X: tuple[str, ...], Y: tuple[str, ...]
+) -> tuple[tuple[int, int], ...]:
+    """
+    二つの音素列の最長共通部分列のインデックスのペアを返す。
+    同じテキストに同じ読みが与えられて何度も音声合成される場合に備え、結果はキャッシュされる。
+
+    Args:
+        X (tuple[str, ...]): 1つ目の音素列
+        Y (tuple[str, ...]): 2つ目の音素列
+
+    Returns:
+        tuple[tuple[int, int], ...]: 共通部分の (X のインデックス, Y のインデックス) のペアのタプル
+    """
+
+    # 末尾から続く一致部分は、DP を逆方向にトレースする際に必ずそのまま対応付けられるので、
+    # DP の対象から外して結果の末尾に直接追加する（差分が少ない場合に DP の表を小さくできる）
+    m, n = len(X), len(Y)
+    n_suffix = 0
+    while n_suffix < min(m, n) and X[m - 1 - n_suffix] == Y[n - 1 - n_suffix]:
+        n_suffix += 1
+    suffix_pairs = tuple((m - n_suffix + k, n - n_suffix + k) for k in range(n_suffix))
+    X, Y = X[: m - n_suffix], Y[: n - n_suffix]
+
+    # 音素を整数 ID に変換し、計算自体は JIT コンパイルされた関数で行う
+    symbol_to_id: dict[str, int] = {}
+    x = np.array(
+        [symbol_to_id.setdefault(s, len(symbol_to_id)) for s in X],
+        dtype=np.int32,
+    )
+    y = np.array(
+        [symbol_to_id.setdefault(s, len(symbol_to_id)) for s in Y],
+        dtype=np.int32,
+    )
+    index_pairs = np.zeros((min(len(X), len(Y)), 2), dtype=np.int32)
+    n_pairs = __longest_common_subsequence_jit(x, y, index_pairs)
+    return tuple((int(i), int(j)) for i, j in index_pairs[:n_pairs]) + suffix_pairs
+
+
+# 指定された音素列の長さが生成された音素列と異なる場合にしか呼ばれないので、import 時にはコンパイルせず、
+# 初回の呼び出し時にコンパイルしてその結果をディスクにキャッシュする
+@numba.njit(cache=True, nogil=True)  # type: ignore
+def __longest_common_subsequence_jit(x: Any, y: Any, index_pairs: Any) -> int:
+    """
+    整数 ID の列 `x` と `y` の最長共通部分列を JIT で計算し、
+    共通部分のインデックスのペアを先頭から順に `index_pairs` に書き込む。
+
+    Args:
+        x: 1つ目の整数 ID の列
+        y: 2つ目の整数 ID の列
+        index_pairs: 結果を格納するための (min(len(x), len(y)), 2) の整数型の 2 次元配列
+
+    Returns:
+        int: 書き込まれたインデックスのペアの数
+    """
+
+    m, n = x.shape[0], y.shape[0]
+    L = np.zeros((m + 1, n + 1), dtype=np.int32)
+    # LCSの長さを構築
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            if x[i - 1] == y[j - 1]:
+                L[i, j] = L[i - 1, j - 1] + 1
+            else:
+                L[i, j] = max(L[i - 1, j], L[i, j - 1])
+    # LCSを逆方向にトレースしてインデックスのペアを取得
+    # LCS の長さは L[m, n] で分かっているので、末尾から順に書き込む
+    n_pairs = L[m, n]
+    k = n_pairs
+    i, j = m, n
+    while i > 0 and j > 0:
+        if x[i - 1] == y[j - 1]:
+            k -= 1
+            index_pairs[k, 0] = i - 1
+            index_pairs[k, 1] = j - 1
+            i -= 1
+            j -= 1
+        elif L[i - 1, j] >= L[i, j - 1]:
+            i -= 1
+        else:
+            j -= 1
+    return n_pairs
+
+
+# アクセント句の終わりに来る記号
+__G2PHONE_TONE_PHRASE_END_SYMBOLS = frozenset(["$", "?", "_", "#"])
+# `__pyopenjtalk_g2p_prosody()` が返す、音素以外の特殊記号
+__G2PHONE_TONE_SPECIAL_SYMBOLS = __G2PHONE_TONE_PHRASE_END_SYMBOLS | {"^", "[", "]"}
+
+
 def __g2phone_tone_wo_punct(text: str) -> list[tuple[str, int]]:
     """
     テキストに対して、音素とアクセント（0か1）のペアのリストを返す。
@@ -392,38 +489,47 @@ def __g2phone_tone_wo_punct(text: str) -> list[tuple[str, int]]:
     result: list[tuple[str, int]] = []
     current_phrase: list[tuple[str, int]] = []
     current_tone = 0
+    # 現在のアクセント句に現れたアクセントの値の集合
+    ## アクセントの値は上昇・下降記号でしか変わらないので、変わった後の最初の音素でのみ記録する
+    current_phrase_tones: set[int] = set()
+    current_tone_recorded = False
 
     for i, letter in enumerate(prosodies):
-        # 特殊記号の処理
-
+        # 通常の音素 (大半を占めるので、特殊記号かどうかを 1 回の集合判定で先に振り分ける)
+        if letter not in __G2PHONE_TONE_SPECIAL_SYMBOLS:
+            if letter == "cl":  # 「っ」の処理
+                letter = "q"
+            # elif letter == "N":  # 「ん」の処理
+            #     letter = "n"
+            current_phrase.append((letter, current_tone))
+            if not current_tone_recorded:
+                current_phrase_tones.add(current_tone)
+                current_tone_recorded = True
         # 文頭記号、無視する
-        if letter == "^":
+        elif letter == "^":
             assert i == 0, "Unexpected ^"
         # アクセント句の終わりに来る記号
-        elif letter in ("$", "?", "_", "#"):
+        elif letter in __G2PHONE_TONE_PHRASE_END_SYMBOLS:
             # 保持しているフレーズを、アクセント数値を 0-1 に修正し結果に追加
-            result.extend(__fix_phone_tone(current_phrase))
+            result.extend(__fix_phone_tone(current_phrase, current_phrase_tones))
             # 末尾に来る終了記号、無視（文中の疑問文は `_` になる）
             if letter in ("$", "?"):
                 assert i == len(prosodies) - 1, f"Unexpected {letter}"
             # あとは "_"（ポーズ）と "#"（アクセント句の境界）のみ
             # これらは残さず、次のアクセント句に備える。
             current_phrase = []
+            current_phrase_tones = set()
             # 0 を基準点にしてそこから上昇・下降する（負の場合は上の `fix_phone_tone` で直る）
             current_tone = 0
+            current_tone_recorded = False
         # アクセント上昇記号
         elif letter == "[":
             current_tone = current_tone + 1
-        # アクセント下降記号
-        elif letter == "]":
-            current_tone = current_tone - 1
-        # それ以外は通常の音素
+            current_tone_recorded = False
+        # アクセント下降記号 ("]")
         else:
-            if letter == "cl":  # 「っ」の処理
-                letter = "q"
-            # elif letter == "N":  # 「ん」の処理
-            #     letter = "n"
-            current_phrase.append((letter, current_tone))
+            current_tone = current_tone - 1
+            current_tone_recorded = False
 
     return result
 
@@ -434,11 +540,43 @@ __PYOPENJTALK_G2P_PROSODY_A3_PATTERN = re.compile(r"\+(\d+)/")
 __PYOPENJTALK_G2P_PROSODY_E3_PATTERN = re.compile(r"!(\d+)_")
 __PYOPENJTALK_G2P_PROSODY_F1_PATTERN = re.compile(r"/F:(\d+)_")
 __PYOPENJTALK_G2P_PROSODY_P3_PATTERN = re.compile(r"\-(.*?)\+")
+# A1・A2・A3・F1 を 1 回の検索でまとめて抽出するパターン
+__PYOPENJTALK_G2P_PROSODY_ACCENT_PATTERN = re.compile(
+    r"/A:([0-9\-]+)\+(\d+)\+(\d+)/.*?/F:(\d+)_"
+)
+# 無声化した母音
+__PYOPENJTALK_G2P_PROSODY_UNVOICED_VOWELS = frozenset("AEIOU")
+# アクセント句の境界の直前に来うる音素（母音・「ん」・「っ」）
+__PYOPENJTALK_G2P_PROSODY_BORDER_PHONEMES = frozenset(
+    ["a", "e", "i", "o", "u", "A", "E", "I", "O", "U", "N", "cl"]
+)
 
 
 def __pyopenjtalk_g2p_prosody(
     text: str, drop_unvoiced_vowels: bool = True
-) -> list[str]:
+) -> tuple[str, ...]:
+    """
+    `__pyopenjtalk_g2p_prosody_cached()` の結果をキャッシュしつつ返す。
+    フルコンテキストラベルの生成と解析は重いので、同じテキストに対しては結果を使い回す。
+    `__run_frontend()` と同様に、ユーザー辞書のバージョンをキャッシュのキーに含めている。
+
+    Args:
+        text (str): 入力テキスト
+        drop_unvoiced_vowels (bool): 無声化した母音を通常の母音として扱うかどうか
+
+    Returns:
+        tuple[str, ...]: 音素と韻律記号のタプル
+    """
+
+    return __pyopenjtalk_g2p_prosody_cached(
+        text, drop_unvoiced_vowels, pyopenjtalk.USER_DICT_VERSION
+    )
+
+
+@lru_cache(maxsize=1024)
+def __pyopenjtalk_g2p_prosody_cached(
+    text: str, drop_unvoiced_vowels: bool, user_dict_version: int
+) -> tuple[str, ...]:
     """
     ESPnet の実装から引用、概ね変更点無し。「ん」は「N」なことに注意。
     ref: https://github.com/espnet/espnet/blob/master/espnet2/text/phoneme_tokenizer.py
@@ -452,9 +590,10 @@ def __pyopenjtalk_g2p_prosody(
     Args:
         text (str): Input text.
         drop_unvoiced_vowels (bool): whether to drop unvoiced vowels.
+        user_dict_version (int): User dictionary version, only used as a cache key.
 
     Returns:
-        List[str]: List of phoneme + prosody symbols.
+        Tuple[str, ...]: Tuple of phoneme + prosody symbols.
 
     Examples:
         >>> from espnet2.text.phoneme_tokenizer import pyopenjtalk_g2p_prosody
@@ -471,8 +610,23 @@ def __pyopenjtalk_g2p_prosody(
             return -50
         return int(match.group(1))
 
-    labels = pyopenjtalk.make_label(pyopenjtalk.run_frontend(text))
+    def _accent_features_by_regex(s: str) -> tuple[int, int, int, int]:
+        match = __PYOPENJTALK_G2P_PROSODY_ACCENT_PATTERN.search(s)
+        if match is None:
+            # sil・pau など A や F が未定義 (xx) のラベルは、従来通り個別に抽出する
+            return (
+                _numeric_feature_by_regex(__PYOPENJTALK_G2P_PROSODY_A1_PATTERN, s),
+                _numeric_feature_by_regex(__PYOPENJTALK_G2P_PROSODY_A2_PATTERN, s),
+                _numeric_feature_by_regex(__PYOPENJTALK_G2P_PROSODY_A3_PATTERN, s),
+                _numeric_feature_by_regex(__PYOPENJTALK_G2P_PROSODY_F1_PATTERN, s),
+            )
+        a1, a2, a3, f1 = match.groups()
+        return int(a1), int(a2), int(a3), int(f1)
+
+    labels = pyopenjtalk.make_label(__run_frontend(text))
     N = len(labels)
+    # アクセント関連の特徴量は全ラベル分を1回ずつだけ抽出しておく (A2 は次のラベルの分も参照される)
+    accent_features = [_accent_features_by_regex(lab) for lab in labels]
 
     phones = []
     for n in range(N):
@@ -481,7 +635,7 @@ def __pyopenjtalk_g2p_prosody(
         # current phoneme
         p3 = __PYOPENJTALK_G2P_PROSODY_P3_PATTERN.search(lab_curr).group(1)  # type: ignore
         # deal unvoiced vowels as normal vowels
-        if drop_unvoiced_vowels and p3 in "AEIOU":
+        if drop_unvoiced_vowels and p3 in __PYOPENJTALK_G2P_PROSODY_UNVOICED_VOWELS:
             p3 = p3.lower()
 
         # deal with sil at the beginning and the end of text
@@ -506,18 +660,12 @@ def __pyopenjtalk_g2p_prosody(
             phones.append(p3)
 
         # accent type and position info (forward or backward)
-        a1 = _numeric_feature_by_regex(__PYOPENJTALK_G2P_PROSODY_A1_PATTERN, lab_curr)
-        a2 = _numeric_feature_by_regex(__PYOPENJTALK_G2P_PROSODY_A2_PATTERN, lab_curr)
-        a3 = _numeric_feature_by_regex(__PYOPENJTALK_G2P_PROSODY_A3_PATTERN, lab_curr)
-
-        # number of mora in accent phrase
-        f1 = _numeric_feature_by_regex(__PYOPENJTALK_G2P_PROSODY_F1_PATTERN, lab_curr)
+        # and number of mora in accent phrase
+        a1, a2, a3, f1 = accent_features[n]
 
-        a2_next = _numeric_feature_by_regex(
-            __PYOPENJTALK_G2P_PROSODY_A2_PATTERN, labels[n + 1]
-        )
+        a2_next = accent_features[n + 1][1]
         # accent phrase border
-        if a3 == 1 and a2_next == 1 and p3 in "aeiouAEIOUNcl":
+        if a3 == 1 and a2_next == 1 and p3 in __PYOPENJTALK_G2P_PROSODY_BORDER_PHONEMES:
             phones.append("#")
         # pitch falling
         elif a1 == 0 and a2_next == a2 + 1 and a2 != f1:
@@ -526,36 +674,37 @@ def __pyopenjtalk_g2p_prosody(
         elif a2 == 1 and a2_next == 2:
             phones.append("[")
 
-    return phones
+    return tuple(phones)
 
 
-def __fix_phone_tone(phone_tone_list: list[tuple[str, int]]) -> list[tuple[str, int]]:
+def __fix_phone_tone(
+    phone_tone_list: list[tuple[str, int]], tone_values: set[int]
+) -> list[tuple[str, int]]:
     """
     `phone_tone_list` の tone（アクセントの値）を 0 か 1 の範囲に修正する。
     例: [(a, 0), (i, -1), (u, -1)] → [(a, 1), (i, 0), (u, 0)]
 
     Args:
         phone_tone_list (list[tuple[str, int]]): 音素とアクセントのペアのリスト
+        tone_values (set[int]): `phone_tone_list` に現れるアクセントの値の集合（呼び出し側で記録済みのもの）
 
     Returns:
         list[tuple[str, int]]: 修正された音素とアクセントのペアのリスト
     """
 
-    tone_values = set(tone for _, tone in phone_tone_list)
-    if len(tone_values) == 1:
-        assert tone_values == {0}, tone_values
-        return phone_tone_list
-    elif len(tone_values) == 2:
-        if tone_values == {0, 1}:
+    # `phone_tone_list` を走査せず、記録済みのアクセントの値の最小値と最大値だけで範囲を判定する
+    if len(tone_values) > 0:
+        min_tone, max_tone = min(tone_values), max(tone_values)
+        if min_tone == max_tone:
+            assert min_tone == 0, tone_values
             return phone_tone_list
-        elif tone_values == {-1, 0}:
-            return [
-                (letter, 0 if tone == -1 else 1) for letter, tone in phone_tone_list
-            ]
-        else:
-            raise ValueError(f"Unexpected tone values: {tone_values}")
-    else:
-        raise ValueError(f"Unexpected tone values: {tone_values}")
+        if max_tone - min_tone == 1:
+            if min_tone == 0:
+                return phone_tone_list
+            if min_tone == -1:
+                # -1 と 0 をそれぞれ 0 と 1 にずらす
+                return [(letter, tone + 1) for letter, tone in phone_tone_list]
+    raise ValueError(f"Unexpected tone values: {tone_values}")
 
 
 def __handle_long(sep_phonemes: list[list[str]]) -> list[list[str]]:
@@ -572,38 +721,43 @@ def __handle_long(sep_phonemes: list[list[str]]) -> list[list[str]]:
         list[list[str]]: 長音記号を処理した音素のリストのリスト
     """
 
-    for i in range(len(sep_phonemes)):
-        if len(sep_phonemes[i]) == 0:
-            # 空白文字等でリストが空の場合
+    for i, phonemes in enumerate(sep_phonemes):
+        # 「ー」を含まないリスト (空白文字等で空の場合も含む) は、1 回の走査だけで飛ばす
+        if "ー" not in phonemes:
             continue
-        if sep_phonemes[i][0] == "ー":
-            if i != 0:
-                prev_phoneme = sep_phonemes[i - 1][-1]
-                if prev_phoneme in VOWELS:
-                    # 母音と「ん」のあとの伸ばし棒なので、その母音に変換
-                    sep_phonemes[i][0] = sep_phonemes[i - 1][-1]
-                else:
-                    # 「。ーー」等おそらく予期しない長音記号
-                    # ダッシュの勘違いだと思われる
-                    sep_phonemes[i][0] = "-"
+        # 先頭とそれ以外の「ー」を、リストを 1 回だけ走査して処理する
+        for j, phoneme in enumerate(phonemes):
+            if phoneme != "ー":
+                continue
+            if j != 0:
+                # 直前の音素の最後の文字に変換
+                phonemes[j] = phonemes[j - 1][-1]
+            elif i != 0 and sep_phonemes[i - 1][-1] in VOWELS:
+                # 母音と「ん」のあとの伸ばし棒なので、その母音に変換
+                phonemes[0] = sep_phonemes[i - 1][-1]
             else:
-                # 冒頭に長音記号が来ていおり、これはダッシュの勘違いと思われる
-                sep_phonemes[i][0] = "-"
-        if "ー" in sep_phonemes[i]:
-            for j in range(len(sep_phonemes[i])):
-                if sep_phonemes[i][j] == "ー":
-                    sep_phonemes[i][j] = sep_phonemes[i][j - 1][-1]
+                # 冒頭に長音記号が来ている場合や、「。ーー」等おそらく予期しない長音記号
+                # ダッシュの勘違いだと思われる
+                phonemes[0] = "-"
 
     return sep_phonemes
 
 
 __KATAKANA_PATTERN = re.compile(r"[\u30A0-\u30FF]+")
-__MORA_PATTERN = re.compile(
-    "|".join(
+# モーラ（カタカナ）から、音素記号のタプルへの対応表
+__MORA_TO_PHONEMES = {
+    mora: (vowel,) if consonant is None else (consonant, vowel)
+    for mora, (consonant, vowel) in MORA_KATA_TO_MORA_PHONEMES.items()
+}
+# モーラと長音記号「ー」の連続を一度の走査で処理するためのパターン
+__MORA_OR_LONG_PATTERN = re.compile(
+    "("
+    + "|".join(
         map(re.escape, sorted(MORA_KATA_TO_MORA_PHONEMES.keys(), key=len, reverse=True))
     )
+    + ")|(ー+)"
 )
-__LONG_PATTERN = re.compile(r"(\w)(ー*)")
+__WORD_CHAR_PATTERN = re.compile(r"\w")
 
 
 def __kata_to_phoneme_list(text: str) -> list[str]:
@@ -625,25 +779,69 @@ def __kata_to_phoneme_list(text: str) -> list[str]:
         list[str]: 音素記号のリスト
     """
 
-    if set(text).issubset(set(PUNCTUATIONS)):
-        return list(text)
+    # 返り値のリストは `__handle_long()` で書き換えられるので、キャッシュとは別のリストにして返す
+    return list(__kata_to_phoneme_tuple(text))
+
+
+@lru_cache(maxsize=4096)
+def __kata_to_phoneme_tuple(text: str) -> tuple[str, ...]:
+    """
+    `__kata_to_phoneme_list()` の本体。同じ読みの単語は頻繁に現れるので、結果をキャッシュする。
+
+    Args:
+        text (str): カタカナのテキスト
+
+    Returns:
+        tuple[str, ...]: 音素記号のタプル
+    """
+
+    if __PUNCTUATIONS_SET.issuperset(text):
+        return tuple(text)
     # `text` がカタカナ（`ー`含む）のみからなるかどうかをチェック
     if __KATAKANA_PATTERN.fullmatch(text) is None:
         raise ValueError(f"Input must be katakana only: {text}")
 
-    def mora2phonemes(mora: str) -> str:
-        consonant, vowel = MORA_KATA_TO_MORA_PHONEMES[mora]
-        if consonant is None:
-            return f" {vowel}"
-        return f" {consonant} {vowel}"
+    # 空白区切りの文字列を経由せず、マッチごとに音素記号のリストへ直接追加していく
+    phonemes: list[str] = []
+    last_end = 0
+    for m in __MORA_OR_LONG_PATTERN.finditer(text):
+        start = m.start()
+        if start > last_end:
+            # どのモーラにも当てはまらない文字は、直前の音素記号にそのままくっつける
+            __append_to_last_phoneme(phonemes, text[last_end:start])
+        mora, long = m.groups()
+        if mora is not None:
+            phonemes.extend(__MORA_TO_PHONEMES[mora])
+        else:
+            # 長音記号「ー」の処理：直前の文字を長音の数だけ繰り返す
+            prev = phonemes[-1][-1] if len(phonemes) > 0 else ""
+            if prev != "" and __WORD_CHAR_PATTERN.fullmatch(prev) is not None:
+                phonemes.extend([prev] * len(long))
+            else:
+                # 冒頭等に続く「ー」はそのまま残す（`__handle_long()` で処理される）
+                __append_to_last_phoneme(phonemes, "ー")
+                phonemes.extend(["ー"] * (len(long) - 1))
+        last_end = m.end()
+    if last_end < len(text):
+        __append_to_last_phoneme(phonemes, text[last_end:])
+
+    return tuple(phonemes)
 
-    spaced_phonemes = __MORA_PATTERN.sub(lambda m: mora2phonemes(m.group()), text)
 
-    # 長音記号「ー」の処理
-    long_replacement = lambda m: m.group(1) + (" " + m.group(1)) * len(m.group(2))  # type: ignore
-    spaced_phonemes = __LONG_PATTERN.sub(long_replacement, spaced_phonemes)
+def __append_to_last_phoneme(phonemes: list[str], s: str) -> None:
+    """
+    `__kata_to_phoneme_tuple()` 用の補助関数。`s` を `phonemes` の最後の要素の末尾にくっつける。
+    `phonemes` が空の場合は、`s` を新しい要素として追加する。
+
+    Args:
+        phonemes (list[str]): 音素記号のリスト
+        s (str): くっつける文字列
+    """
 
-    return spaced_phonemes.strip().split(" ")
+    if len(phonemes) > 0:
+        phonemes[-1] += s
+    else:
+        phonemes.append(s)
 
 
 def __align_tones(
@@ -668,16 +866,18 @@ def __align_tones(
 
     result: list[tuple[str, int]] = []
     tone_index = 0
+    n_tones = len(phone_tone_list)
     for phone in phones_with_punct:
-        if tone_index >= len(phone_tone_list):
+        if tone_index >= n_tones:
             # 余った punctuation がある場合 → (punctuation, 0) を追加
             result.append((phone, 0))
         elif phone == phone_tone_list[tone_index][0]:
-            # phone_tone_list の現在の音素と一致する場合 → tone をそこから取得、(phone, tone) を追加
-            result.append((phone, phone_tone_list[tone_index][1]))
+            # phone_tone_list の現在の音素と一致する場合 → (phone, tone) を追加
+            ## 一致しているので、新しくタプルを作らずに phone_tone_list の要素をそのまま使う
+            result.append(phone_tone_list[tone_index])
             # 探す index を1つ進める
             tone_index += 1
-        elif phone in PUNCTUATIONS:
+        elif phone in __PUNCTUATIONS_SET:
             # phone が punctuation の場合 → (phone, 0) を追加
             result.append((phone, 0))
         else:
@@ -695,6 +895,7 @@ def __distribute_phone(n_phone: int, n_word: int) -> list[int]:
     """
     左から右に 1 ずつ振り分け、次にまた左から右に1ずつ増やし、というふうに、
     音素の数 `n_phone` を単語の数 `n_word` に分配する。
+    結果として各単語には商の数だけ音素が割り当てられ、左から余りの数の単語に 1 つずつ追加される。
 
     Args:
         n_phone (int): 音素の数
@@ -704,13 +905,13 @@ def __distribute_phone(n_phone: int, n_word: int) -> list[int]:
         list[int]: 単語ごとの音素の数のリスト
     """
 
-    phones_per_word = [0] * n_word
-    for _ in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-
-    return phones_per_word
+    if n_word == 0:
+        # 分配先の単語がない場合は、分配する音素もないはず
+        if n_phone != 0:
+            raise ValueError(f"Cannot distribute {n_phone} phones to 0 words")
+        return []
+    base, remainder = divmod(n_phone, n_word)
+    return [base + 1] * remainder + [base] * (n_word - remainder)
 
 
 class YomiError(Exception):
@@ -7,6 +7,10 @@ from style_bert_vits2.nlp.japanese.mora_list import (
 from style_bert_vits2.nlp.symbols import PUNCTUATIONS
 
 
+# punctuation の判定は音素・モーラごとに行われるので、事前に set にしておく
+__PUNCTUATIONS_SET = frozenset(PUNCTUATIONS)
+
+
 def g2kata_tone(norm_text: str) -> list[tuple[str, int]]:
     """
     テキストからカタカナとアクセントのペアのリストを返す。
@@ -41,7 +45,7 @@ def phone_tone2kata_tone(phone_tone: list[tuple[str, int]]) -> list[tuple[str, i
     current_mora = ""
     for phone, next_phone, tone, next_tone in zip(phones, phones[1:], tones, tones[1:]):
         # zip の関係で最後の ("_", 0) は無視されている
-        if phone in PUNCTUATIONS:
+        if phone in __PUNCTUATIONS_SET:
             result.append((phone, tone))
             continue
         if phone in CONSONANTS:  # n以外の子音の場合
@@ -70,7 +74,7 @@ def kata_tone2phone_tone(kata_tone: list[tuple[str, int]]) -> list[tuple[str, in
 
     result: list[tuple[str, int]] = [("_", 0)]
     for mora, tone in kata_tone:
-        if mora in PUNCTUATIONS:
+        if mora in __PUNCTUATIONS_SET:
             result.append((mora, tone))
         else:
             consonant, vowel = MORA_KATA_TO_MORA_PHONEMES[mora]
@@ -59,12 +59,10 @@ __REPLACE_MAP = {
     "「": "'",
     "」": "'",
 }
-# 記号類の正規化パターン
-__REPLACE_PATTERN = re.compile("|".join(re.escape(p) for p in __REPLACE_MAP))
-# 句読点等の正規化パターン
-__PUNCTUATION_CLEANUP_PATTERN = re.compile(
+# 句読点等の正規化で残す文字の文字クラス（これ以外の文字は削除される）
+__KEEP_CHARS = (
     # ↓ ひらがな、カタカナ、漢字
-    r"[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF\u3400-\u4DBF\u3005"
+    r"\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF\u3400-\u4DBF\u3005"
     # ↓ 半角アルファベット（大文字と小文字）
     + r"\u0041-\u005A\u0061-\u007A"
     # ↓ 全角アルファベット（大文字と小文字）
@@ -72,13 +70,28 @@ __PUNCTUATION_CLEANUP_PATTERN = re.compile(
     # ↓ ギリシャ文字
     + r"\u0370-\u03FF\u1F00-\u1FFF"
     # ↓ "!", "?", "…", ",", ".", "'", "-", 但し`…`はすでに`...`に変換されている
-    + "".join(PUNCTUATIONS) + r"]+",  # fmt: skip
+    + "".join(PUNCTUATIONS)
+)
+# 記号類の置換と、それ以外の読めない文字の削除を一度の走査で行うパターン
+# 置換対象の文字は削除側の文字クラスから除外し、必ず置換側にマッチさせる
+__REPLACE_OR_CLEANUP_PATTERN = re.compile(
+    "(?P<replace>"
+    + "|".join(re.escape(p) for p in __REPLACE_MAP)
+    + ")"
+    + "|(?P<cleanup>[^"
+    + "".join(re.escape(c) for c in sorted(set("".join(__REPLACE_MAP))))
+    + __KEEP_CHARS
+    + "]+)"
 )
 # 数字・通貨記号の正規化パターン
 __CURRENCY_MAP = {"$": "ドル", "¥": "円", "£": "ポンド", "€": "ユーロ"}
 __CURRENCY_PATTERN = re.compile(r"([$¥£€])([0-9.]*[0-9])")
 __NUMBER_PATTERN = re.compile(r"[0-9]+(\.[0-9]+)?")
 __NUMBER_WITH_SEPARATOR_PATTERN = re.compile("[0-9]{1,3}(,[0-9]{3})+")
+# 「～」と「〜」と「~」を長音記号「ー」に変換するテーブル
+__TILDE_TO_LONG_TABLE = str.maketrans({"~": "ー", "～": "ー", "〜": "ー"})
+# 結合文字の濁点・半濁点を削除するテーブル
+__COMBINING_VOICED_MARK_TABLE = str.maketrans("", "", "\u3099\u309A")
 
 
 def normalize_text(text: str) -> str:
@@ -112,16 +125,14 @@ def normalize_text(text: str) -> str:
     res = unicodedata.normalize("NFKC", text)  # ここでアルファベットは半角になる
     res = __convert_numbers_to_words(res)  # 「100円」→「百円」等
     # 「～」と「〜」と「~」も長音記号として扱う
-    res = res.replace("~", "ー")
-    res = res.replace("～", "ー")
-    res = res.replace("〜", "ー")
+    res = res.translate(__TILDE_TO_LONG_TABLE)
 
     res = replace_punctuation(res)  # 句読点等正規化、読めない文字を削除
 
     # 結合文字の濁点・半濁点を削除
     # 通常の「ば」等はそのままのこされる、「あ゛」は上で「あ゙」になりここで「あ」になる
-    res = res.replace("\u3099", "")  # 結合文字の濁点を削除、る゙ → る
-    res = res.replace("\u309A", "")  # 結合文字の半濁点を削除、な゚ → な
+    # る゙ → る、な゚ → な
+    res = res.translate(__COMBINING_VOICED_MARK_TABLE)
     return res
 
 
@@ -137,13 +148,10 @@ def replace_punctuation(text: str) -> str:
         str: 正規化されたテキスト
     """
 
-    # 句読点を辞書で置換
-    replaced_text = __REPLACE_PATTERN.sub(lambda x: __REPLACE_MAP[x.group()], text)
-
-    # 上述以外の文字を削除
-    replaced_text = __PUNCTUATION_CLEANUP_PATTERN.sub("", replaced_text)
-
-    return replaced_text
+    # 句読点を辞書で置換し、上述以外の文字を削除する
+    return __REPLACE_OR_CLEANUP_PATTERN.sub(
+        lambda m: __REPLACE_MAP[m.group()] if m.lastgroup == "replace" else "", text
+    )
 
 
 def __convert_numbers_to_words(text: str) -> str:
@@ -12,6 +12,10 @@ from style_bert_vits2.nlp.japanese.pyopenjtalk_worker.worker_common import WORKE
 
 WORKER_CLIENT: Optional[WorkerClient] = None
 
+# ユーザー辞書が更新されるたびにインクリメントされるカウンター
+# 解析結果をキャッシュする側は、この値をキャッシュのキーに含めることで辞書の更新を検知できる
+USER_DICT_VERSION: int = 0
+
 
 # pyopenjtalk interface
 # g2p(): not used
@@ -52,23 +56,39 @@ def mecab_dict_index(path: str, out_path: str, dn_mecab: Optional[str] = None) -
 
 
 def update_global_jtalk_with_user_dict(path: str) -> None:
-    if WORKER_CLIENT is not None:
-        WORKER_CLIENT.dispatch_pyopenjtalk("update_global_jtalk_with_user_dict", path)
-    else:
-        # without worker
-        import pyopenjtalk
+    global USER_DICT_VERSION
+    # 辞書の切り替え中に解析された結果は、古い辞書と新しい辞書のどちらによるものか分からない
+    # 切り替えの前後でインクリメントし、切り替え中のバージョンをキーにしたキャッシュが以降参照されないようにする
+    USER_DICT_VERSION += 1
+    try:
+        if WORKER_CLIENT is not None:
+            WORKER_CLIENT.dispatch_pyopenjtalk(
+                "update_global_jtalk_with_user_dict", path
+            )
+        else:
+            # without worker
+            import pyopenjtalk
 
-        pyopenjtalk.update_global_jtalk_with_user_dict(path)
+            pyopenjtalk.update_global_jtalk_with_user_dict(path)
+    finally:
+        USER_DICT_VERSION += 1
 
 
 def unset_user_dict() -> None:
-    if WORKER_CLIENT is not None:
-        WORKER_CLIENT.dispatch_pyopenjtalk("unset_user_dict")
-    else:
-        # without worker
-        import pyopenjtalk
+    global USER_DICT_VERSION
+    # 辞書の切り替え中に解析された結果は、古い辞書と新しい辞書のどちらによるものか分からない
+    # 切り替えの前後でインクリメントし、切り替え中のバージョンをキーにしたキャッシュが以降参照されないようにする
+    USER_DICT_VERSION += 1
+    try:
+        if WORKER_CLIENT is not None:
+            WORKER_CLIENT.dispatch_pyopenjtalk("unset_user_dict")
+        else:
+            # without worker
+            import pyopenjtalk
 
-        pyopenjtalk.unset_user_dict()
+            pyopenjtalk.unset_user_dict()
+    finally:
+        USER_DICT_VERSION += 1
 
 
 # initialize module when imported
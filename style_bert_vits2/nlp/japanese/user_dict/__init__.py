@@ -40,6 +40,16 @@ compiled_dict_path = (
 )  # コンパイル済み辞書ファイルのパス
 
 
+# 辞書.csv の1行 (1単語) のフォーマット
+_USER_DICT_CSV_ROW_FORMAT = (
+    "{surface},{context_id},{context_id},{cost},{part_of_speech},"
+    + "{part_of_speech_detail_1},{part_of_speech_detail_2},"
+    + "{part_of_speech_detail_3},{inflectional_type},"
+    + "{inflectional_form},{stem},{yomi},{pronunciation},"
+    + "{accent_type}/{mora_count},{accent_associative_rule}\n"
+)
+
+
 # # 同時書き込みの制御
 # mutex_user_dict = threading.Lock()
 # mutex_openjtalk_dict = threading.Lock()
@@ -99,7 +109,8 @@ def update_dict(
 
     try:
         # 辞書.csvを作成
-        csv_text = ""
+        # 単語ごとに文字列を連結し直さないよう、行のリストを作って最後に一度だけ結合する
+        csv_lines: List[str] = []
 
         # デフォルト辞書データの追加
         if not default_dict_path.is_file():
@@ -108,35 +119,32 @@ def update_dict(
         default_dict = default_dict_path.read_text(encoding="utf-8")
         if default_dict == default_dict.rstrip():
             default_dict += "\n"
-        csv_text += default_dict
+        csv_lines.append(default_dict)
 
         # ユーザー辞書データの追加
         user_dict = read_dict(user_dict_path=user_dict_path)
         for word_uuid in user_dict:
             word = user_dict[word_uuid]
-            csv_text += (
-                "{surface},{context_id},{context_id},{cost},{part_of_speech},"
-                + "{part_of_speech_detail_1},{part_of_speech_detail_2},"
-                + "{part_of_speech_detail_3},{inflectional_type},"
-                + "{inflectional_form},{stem},{yomi},{pronunciation},"
-                + "{accent_type}/{mora_count},{accent_associative_rule}\n"
-            ).format(
-                surface=word.surface,
-                context_id=word.context_id,
-                cost=_priority2cost(word.context_id, word.priority),
-                part_of_speech=word.part_of_speech,
-                part_of_speech_detail_1=word.part_of_speech_detail_1,
-                part_of_speech_detail_2=word.part_of_speech_detail_2,
-                part_of_speech_detail_3=word.part_of_speech_detail_3,
-                inflectional_type=word.inflectional_type,
-                inflectional_form=word.inflectional_form,
-                stem=word.stem,
-                yomi=word.yomi,
-                pronunciation=word.pronunciation,
-                accent_type=word.accent_type,
-                mora_count=word.mora_count,
-                accent_associative_rule=word.accent_associative_rule,
+            csv_lines.append(
+                _USER_DICT_CSV_ROW_FORMAT.format(
+                    surface=word.surface,
+                    context_id=word.context_id,
+                    cost=_priority2cost(word.context_id, word.priority),
+                    part_of_speech=word.part_of_speech,
+                    part_of_speech_detail_1=word.part_of_speech_detail_1,
+                    part_of_speech_detail_2=word.part_of_speech_detail_2,
+                    part_of_speech_detail_3=word.part_of_speech_detail_3,
+                    inflectional_type=word.inflectional_type,
+                    inflectional_form=word.inflectional_form,
+                    stem=word.stem,
+                    yomi=word.yomi,
+                    pronunciation=word.pronunciation,
+                    accent_type=word.accent_type,
+                    mora_count=word.mora_count,
+                    accent_associative_rule=word.accent_associative_rule,
+                )
             )
+        csv_text = "".join(csv_lines)
         # 辞書データを辞書.csv へ一時保存
         tmp_csv_path.write_text(csv_text, encoding="utf-8")
 
@@ -20,7 +20,7 @@ from style_bert_vits2.constants import (
 )
 from style_bert_vits2.logging import logger
 from style_bert_vits2.models.hyper_parameters import HyperParameters
-from style_bert_vits2.models.infer import get_net_g, infer
+from style_bert_vits2.models.infer import get_net_g, infer, warmup_net_g
 from style_bert_vits2.models.models import SynthesizerTrn
 from style_bert_vits2.models.models_jp_extra import (
     SynthesizerTrn as SynthesizerTrnJPExtra,
@@ -60,6 +60,11 @@ class TTSModel:
         """
 
         self.model_path: Path = model_path
+
+        # CUDA が利用できない環境で cuda が指定された場合は、CPU で推論する
+        if device.startswith("cuda") and not torch.cuda.is_available():
+            logger.warning(f"CUDA is not available, so using CPU instead of {device}")
+            device = "cpu"
         self.device: str = device
 
         # ハイパーパラメータの Pydantic モデルが直接指定された
@@ -106,6 +111,7 @@ class TTSModel:
     def load(self) -> None:
         """
         音声合成モデルをデバイスにロードする。
+        初回推論時のみにかかるコストを除くため、ロード後にダミー入力で 1 回推論を実行しておく。
         """
         self.__net_g = get_net_g(
             model_path=str(self.model_path),
@@ -113,6 +119,15 @@ class TTSModel:
             device=self.device,
             hps=self.hyper_parameters,
         )
+        # 推論時は重みが変化しないので、デコーダーの weight norm を畳み込みの重みに統合しておく
+        # こうすることで、推論のたびに weight norm から重みを再計算する処理が不要になる
+        # Generator.remove_weight_norm() は標準出力に print してしまうため、各層の weight norm を直接外す
+        for layer in self.__net_g.dec.ups:
+            torch.nn.utils.remove_weight_norm(layer)
+        for layer in self.__net_g.dec.resblocks:
+            layer.remove_weight_norm()
+        warmup_net_g(self.__net_g, self.hyper_parameters, self.device)
+        logger.info(f"Model loaded on {self.device}")
 
     def __get_style_vector(self, style_id: int, weight: float = 1.0) -> NDArray[Any]:
         """
@@ -1,7 +1,9 @@
+import numpy as np
 import pytest
 from scipy.io import wavfile
 
 from style_bert_vits2.constants import BASE_DIR, Languages
+from style_bert_vits2.models.infer import get_net_g, infer, infer_batch
 from style_bert_vits2.tts_model import TTSModelHolder
 
 
@@ -54,3 +56,56 @@ def test_synthesize_cpu():
 # Windows環境ではtorchのcudaが簡単に入らないため、テストをスキップ
 # def test_synthesize_cuda():
 #     synthesize(device="cuda")
+
+
+def infer_batch_matches_infer(device: str = "cpu"):
+
+    # 音声合成モデルが配置されていれば、まとめて音声合成した結果とテキストごとに音声合成した結果を比較
+    model_holder = TTSModelHolder(BASE_DIR / "model_assets", device)
+    for model_info in model_holder.models_info:
+        if model_info.name == "jvnv-F2-jp":
+            model = model_holder.get_model(model_info.name, model_info.files[0])
+            hps = model.hyper_parameters
+            net_g = get_net_g(
+                model_path=str(model.model_path),
+                version=hps.version,
+                device=device,
+                hps=hps,
+            )
+            style_vec = np.load(model.style_vec_path)[0]
+            params = dict(
+                style_vec=style_vec,
+                # SDP のノイズで音素の長さが変わらないよう、DP のみを使う
+                sdp_ratio=0.0,
+                noise_scale=0.6,
+                noise_scale_w=0.8,
+                length_scale=1.0,
+                sid=0,
+                language=Languages.JP,
+                hps=hps,
+                net_g=net_g,
+                device=device,
+            )
+
+            # 長さの異なるテキストを混ぜて、パディングが必要になるようにする
+            texts = [
+                "こんにちは。",
+                "あらゆる現実を、すべて自分のほうへねじ曲げたのだ。",
+                "はい。",
+            ]
+            audios = infer_batch(texts=texts, **params)
+
+            # テキストごとに、infer() と同じ長さ・形状の音声が返されることを確認
+            assert len(audios) == len(texts)
+            for text, audio in zip(texts, audios):
+                assert audio.shape == infer(text=text, **params).shape
+
+            # テキストが空の場合は、空のリストが返されることを確認
+            assert infer_batch(texts=[], **params) == []
+            return
+
+    pytest.skip("音声合成モデルが見つかりませんでした。")
+
+
+def test_infer_batch_cpu():
+    infer_batch_matches_infer(device="cpu")